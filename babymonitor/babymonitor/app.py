@@ -1,4 +1,5 @@
 # app.py
+import json
 import os
 import threading
 import time
@@ -19,17 +20,24 @@ if platform.system() == "Windows":
     from io import BytesIO
     from PIL import Image
 
-    def mjpeg_frame_generator():
-        # Static black frame for Windows testing
+    def _black_frame_part() -> bytes:
+        # Static black frame for Windows testing, wrapped as one multipart chunk
         img = Image.new("RGB", (640, 480), color=(0, 0, 0))
         buf = BytesIO()
         img.save(buf, format="JPEG")
         frame = buf.getvalue()
+        return (
+            b"--frame\r\n"
+            b"Content-Type: image/jpeg\r\n"
+            b"Content-Length: %d\r\n\r\n" % len(frame) + frame + b"\r\n"
+        )
+
+    _BLACK_FRAME_PART = _black_frame_part()
+
+    def mjpeg_frame_generator():
         while True:
-            yield (
-                b"--frame\r\n"
-                b"Content-Type: image/jpeg\r\n\r\n" + frame + b"\r\n"
-            )
+            yield _BLACK_FRAME_PART
+            time.sleep(1 / 30)  # the frame never changes; don't spin a core
 else:
     # Real Pi camera generator (can raise if camera not connected)
     from camera_stream import mjpeg_frame_generator as _pi_mjpeg
@@ -50,19 +58,29 @@ class SystemState:
         self.last_cry_time = None
         self.cry_count = 0
         self.lock = threading.Lock()
+        # serialized /api/status body, rebuilt only when a cry is recorded
+        self._cached = json.dumps(self._snapshot()).encode()
 
     def record_cry(self):
         with self.lock:
             self.last_cry_time = datetime.now()
             self.cry_count += 1
+            self._cached = json.dumps(self._snapshot()).encode()
+
+    def _snapshot(self):
+        return {
+            "last_cry_time": self.last_cry_time.isoformat(timespec="seconds")
+            if self.last_cry_time else None,
+            "cry_count": self.cry_count,
+        }
 
     def to_dict(self):
-        with self.lock:
-            return {
-                "last_cry_time": self.last_cry_time.isoformat(timespec="seconds")
-                if self.last_cry_time else None,
-                "cry_count": self.cry_count,
-            }
+        # parsed from the cached body so there is one source for the snapshot
+        return json.loads(self._cached)
+
+    def cached_json(self) -> bytes:
+        # a single attribute read is atomic in CPython, so pollers skip the lock
+        return self._cached
 
 system_state = SystemState()
 cry_detector: CryDetector | None = None
@@ -72,17 +90,15 @@ def on_cry_detected(energy: float):
     print(f"[App] Cry callback received with energy {energy:.4f}")
     system_state.record_cry()
 
-    def send_alert():
-        try:
-            subject = "Baby Monitor Alert: Cry detected"
-            time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            body = f"Cry detected at {time_str} with energy {energy:.4f}."
-            send_email_alert(subject, body)
-        except Exception as e:
-            # Never crash the app if email fails
-            print(f"[Notifier] Email alert failed: {e}")
-
-    threading.Thread(target=send_alert, daemon=True).start()
+    # send_email_alert only queues the message for the notifier's worker
+    try:
+        subject = "Baby Monitor Alert: Cry detected"
+        time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        body = f"Cry detected at {time_str} with energy {energy:.4f}."
+        send_email_alert(subject, body)
+    except Exception as e:
+        # Never crash the app if email fails
+        print(f"[Notifier] Email alert failed: {e}")
 
 # ---------------- Routes ----------------
 @app.route("/")
@@ -98,7 +114,7 @@ def video_feed():
 
 @app.route("/api/status")
 def api_status():
-    return jsonify(system_state.to_dict())
+    return Response(system_state.cached_json(), mimetype="application/json")
 
 # --- lullaby endpoints with pause/resume and extra logging ---
 @app.route("/api/lullaby/<name>", methods=["POST"])
@@ -2,18 +2,40 @@
 import os
 import time
 import json
-import queue
+import math
 import threading
+from functools import lru_cache
 from pathlib import Path
 
 import numpy as np
 import sounddevice as sd
 from scipy.io import wavfile  # apt/pip: python3-scipy
+from scipy.signal import get_window, resample_poly, stft
+
+try:
+    from numba import njit  # optional: pip install numba
+except ImportError:
+    njit = None
+
+try:
+    import onnxruntime as ort  # optional cry model: pip install onnxruntime
+except ImportError:
+    ort = None
+
+try:
+    import librosa  # optional: mel filterbank for extract_features
+except ImportError:
+    librosa = None
 
 CONFIG_PATH = Path("config/settings.json")
 
 
+@lru_cache(maxsize=1)
 def load_config():
+    """
+    Read settings.json once. The dict is shared, so treat it as read-only;
+    call load_config.cache_clear() to pick up edits.
+    """
     with open(CONFIG_PATH, "r") as f:
         return json.load(f)
 
@@ -33,13 +55,79 @@ def normalise_audio(data):
 
 def compute_frame_energy(samples: np.ndarray) -> float:
     """Return RMS energy of an array of samples in [-1, 1]."""
-    samples = np.asarray(samples, dtype=np.float32)
+    samples = np.asarray(samples, dtype=np.float32)  # no copy if already float32
     if samples.size == 0:
         return 0.0
-    samples = samples[np.isfinite(samples)]
+    # single pass sum of squares, no temporary samples*samples array
+    sq = float(np.dot(samples, samples))
+    if not math.isfinite(sq):
+        # NaN/inf never come from PortAudio; treat a corrupt frame as silence
+        return 0.0
+    return math.sqrt(sq / samples.size)
+
+
+def compute_frame_energy_i16(samples: np.ndarray) -> float:
+    """RMS energy of int16 PCM, scaled to the same [-1, 1] range as above."""
     if samples.size == 0:
         return 0.0
-    return float(np.sqrt(np.mean(samples * samples)))
+    # int64 accumulation without materialising an int64 copy of the frame
+    sq = int(np.einsum("i,i->", samples, samples, dtype=np.int64))
+    return math.sqrt(sq / samples.size) / 32768.0
+
+
+@lru_cache(maxsize=4)
+def _mel_filterbank(sr, n_fft, n_mels):
+    return librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels).astype(np.float32)
+
+
+def extract_features(data, sr, n_fft=512, hop_length=160, n_mels=40):
+    """
+    Log-mel spectrogram of one clip (n,) or a batch of clips (..., n).
+    All frames go through one batched STFT and one matmul with a cached
+    mel filterbank. Returns float32 of shape (..., n_mels, n_frames).
+    """
+    _, _, spec = stft(
+        np.asarray(data, dtype=np.float32), fs=sr, nperseg=n_fft,
+        noverlap=n_fft - hop_length, padded=False, return_onesided=True, axis=-1,
+    )
+    # scipy scales each frame by 1 / sum(window); undo it so the power
+    # matches librosa.feature.melspectrogram, which the model was trained on
+    spec *= get_window("hann", n_fft).sum()
+    power = spec.real ** 2 + spec.imag ** 2  # (..., n_fft // 2 + 1, n_frames)
+    mel = _mel_filterbank(sr, n_fft, n_mels) @ power
+    return np.log(mel + 1e-6).astype(np.float32, copy=False)
+
+
+if njit is not None:
+    @njit(cache=True, fastmath=True)
+    def _rms(samples):
+        """JIT-compiled RMS of a contiguous float32 frame (live detector hot path)."""
+        n = samples.shape[0]
+        if n == 0:
+            return 0.0
+        acc = 0.0
+        for i in range(n):
+            acc += samples[i] * samples[i]
+        return math.sqrt(acc / n)
+
+    @njit(cache=True)
+    def _rms_i16(samples):
+        """JIT-compiled RMS of an int16 frame, scaled to [-1, 1]."""
+        n = samples.shape[0]
+        if n == 0:
+            return 0.0
+        acc = np.int64(0)
+        for i in range(n):
+            v = np.int64(samples[i])
+            acc += v * v
+        return math.sqrt(acc / n) / 32768.0
+
+    # compile (or load from the on-disk cache) now, not on the first audio frame
+    _rms(np.zeros(1, dtype=np.float32))
+    _rms_i16(np.zeros(1, dtype=np.int16))
+else:
+    _rms = compute_frame_energy
+    _rms_i16 = compute_frame_energy_i16
 
 
 def analyse_training_wavs():
@@ -54,15 +142,56 @@ def analyse_training_wavs():
         if data.ndim > 1:
             data = data[:, 0]
         frame_size = int(sr * config.get("frame_duration_sec", 0.5))
-        energies = []
-        for start in range(0, len(data), frame_size):
-            frame = data[start:start + frame_size]
-            e = compute_frame_energy(frame)
-            energies.append(e)
+        # RMS of all full frames at once: (n_frames, frame_size) -> (n_frames,)
+        n = (len(data) // frame_size) * frame_size
+        frames = data[:n].reshape(-1, frame_size).astype(np.float32, copy=False)
+        energies = np.sqrt(np.einsum("ij,ij->i", frames, frames) / frame_size)
+        if n < len(data):
+            # keep the trailing partial frame, as before
+            energies = np.append(energies, compute_frame_energy(data[n:]))
         print(f"\nFile: {wav_path.name}")
         print("Frame energies (first 20):")
-        print([round(e, 4) for e in energies[:20]])
-        print(f"Max energy: {max(energies):.4f}")
+        print(energies[:20].round(4).tolist())
+        print(f"Max energy: {energies.max():.4f}")
+        if librosa is not None:
+            bands = extract_features(data, sr).mean(axis=-1)
+            print("Mean log-mel per band:")
+            print(bands.round(2).tolist())
+
+
+class CryClassifier:
+    """
+    Optional cry / non-cry model (ONNX) used to confirm loud audio.
+    The model takes extract_features() log-mels (batch, n_mels, time) at 16 kHz and
+    returns the cry probability in the last column of its first output.
+    """
+
+    sample_rate = 16000
+    window_sec = 1.0
+    hop_sec = 0.2  # 80% overlap between consecutive windows
+
+    def __init__(self, model_path, threads=2):
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            str(model_path), sess_options=opts, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def cry_probability(self, audio, sr) -> float:
+        """Mean cry probability over all 1 s windows of a float audio clip."""
+        audio = np.asarray(audio, dtype=np.float32)
+        if sr != self.sample_rate:
+            audio = resample_poly(audio, self.sample_rate, sr).astype(np.float32)
+        win = int(self.sample_rate * self.window_sec)
+        hop = int(self.sample_rate * self.hop_sec)
+        if len(audio) < win:
+            audio = np.pad(audio, (0, win - len(audio)))
+        windows = np.lib.stride_tricks.sliding_window_view(audio, win)[::hop]
+        feats = extract_features(windows, self.sample_rate)
+        out = self.session.run(None, {self.input_name: feats})[0]
+        probs = np.asarray(out, dtype=np.float32).reshape(len(windows), -1)[:, -1]
+        return float(probs.mean())
 
 
 class CryDetector(threading.Thread):
@@ -80,13 +209,36 @@ class CryDetector(threading.Thread):
         self.frames_required = int(self.config.get("cry_frames_required", 3))
         self.on_cry_callback = on_cry_callback
 
+        # Optional ONNX model that must agree before a loud run counts as a cry
+        self.classifier = None
+        self.model_threshold = float(self.config.get("cry_model_threshold", 0.5))
+        model_path = self.config.get("cry_model_path")
+        if model_path:
+            if ort is None or librosa is None:
+                print("[CryDetector] cry_model_path set but onnxruntime/librosa missing; using energy only")
+            else:
+                self.classifier = CryClassifier(model_path)
+                print(f"[CryDetector] Loaded cry model {model_path}")
+
         # Optional input device: index/int, name, or ALSA name; can also come from env
         self.input_device = self.config.get("input_device") or os.getenv("SD_INPUT_DEVICE")
 
-        self._audio_queue = queue.Queue()
+        # "int16" (default) is most mics' native format: half the bytes of
+        # float32 and no conversion in PortAudio. "float32" is the fallback.
+        self.input_dtype = self.config.get("input_dtype", "int16")
+        self._energy = _rms_i16 if self.input_dtype == "int16" else _rms
+
+        # Preallocated ring of mono frames written by the audio callback.
+        # _wi counts frames written so far; the slot is _wi % ring_slots.
+        # (must also hold a whole loud run for the cry model)
+        self.ring_slots = max(int(self.config.get("ring_slots", 8)), self.frames_required + 1)
+        self._ring = None
+        self._wi = 0
         self._running = False
         self._paused = False
         self._cry_frame_count = 0
+        # guards _cry_frame_count / _last_event_time (audio thread vs. notifier)
+        self._state_lock = threading.Lock()
 
         # cooldown between events (seconds)
         self._last_event_time = 0.0
@@ -113,17 +265,48 @@ class CryDetector(threading.Thread):
     def _audio_callback(self, indata, frames, time_info, status):
         if status:
             print("Audio status:", status)
-        # indata shape: (frames, channels), dtype float32 in [-1,1]
-        mono = indata[:, 0]
-        self._audio_queue.put(mono.copy())
+        # indata shape: (frames, channels), dtype int16 or float32 (input_dtype)
+        # copy into the next preallocated slot: no allocation per block
+        frame = self._ring[self._wi % self.ring_slots]
+        np.copyto(frame, indata[:, 0])
+        self._wi += 1
+
+        if self._paused:
+            # Skip computation while paused
+            return
+
+        # Detection runs right here on PortAudio's thread: no queue, no polling
+        energy = self._energy(frame)
+        now = time.time()
+        with self._state_lock:
+            if energy >= self.threshold:
+                self._cry_frame_count += 1
+            else:
+                self._cry_frame_count = 0
+
+            if self._cry_frame_count < self.frames_required:
+                return
+            self._cry_frame_count = 0
+            if now - self._last_event_time < self.event_cooldown:
+                return
+
+        audio = None
+        if self.classifier is not None:
+            # snapshot the loud run before the ring wraps over it
+            idx = [i % self.ring_slots for i in range(self._wi - self.frames_required, self._wi)]
+            audio = self._ring[idx].reshape(-1)
+        # the model and the app callback must never block the audio thread
+        threading.Thread(target=self._confirm_cry, args=(energy, audio), daemon=True).start()
 
     def _open_stream(self, samplerate):
         """Try to open the input stream with a given samplerate and device."""
         blocksize = int(max(1, round(samplerate * self.frame_duration)))
+        self._ring = np.zeros((self.ring_slots, blocksize), dtype=self.input_dtype)
+        self._wi = 0
         kwargs = dict(
             channels=1,
             samplerate=int(samplerate),
-            dtype="float32",
+            dtype=self.input_dtype,
             callback=self._audio_callback,
             blocksize=blocksize,
         )
@@ -131,6 +314,31 @@ class CryDetector(threading.Thread):
             kwargs["device"] = self.input_device
         return sd.InputStream(**kwargs)
 
+    def _is_cry(self, audio):
+        """Ask the cry model about a loud run of raw samples (None = no model)."""
+        if self.classifier is None or audio is None:
+            return True
+        try:
+            prob = self.classifier.cry_probability(normalise_audio(audio), self.sample_rate)
+        except Exception as e:
+            print("[CryDetector] Cry model failed, using energy only:", e)
+            return True
+        print(f"[CryDetector] Cry model probability={prob:.2f}")
+        return prob > self.model_threshold
+
+    def _confirm_cry(self, energy, audio):
+        """Runs on a short-lived thread for each loud run that passed cooldown."""
+        if not self._is_cry(audio):
+            return
+        with self._state_lock:
+            now = time.time()
+            if now - self._last_event_time < self.event_cooldown:
+                return
+            self._last_event_time = now
+        print(f"[CryDetector] Cry detected! energy={energy:.4f}")
+        if self.on_cry_callback:
+            self.on_cry_callback(energy)
+
     # --- main loop ---------------------------------------------------------
 
     def run(self):
@@ -152,35 +360,10 @@ class CryDetector(threading.Thread):
                 else:
                     raise
 
+            # detection happens in _audio_callback; this thread only owns the stream
             with stream:
                 while self._running:
-                    try:
-                        frame = self._audio_queue.get(timeout=1.0)
-                    except queue.Empty:
-                        continue
-
-                    if self._paused:
-                        # Skip computation while paused
-                        time.sleep(0.005)
-                        continue
-
-                    energy = compute_frame_energy(frame)
-                    now = time.time()
-
-                    if energy >= self.threshold:
-                        self._cry_frame_count += 1
-                    else:
-                        self._cry_frame_count = 0
-
-                    if self._cry_frame_count >= self.frames_required:
-                        if now - self._last_event_time >= self.event_cooldown:
-                            print(f"[CryDetector] Cry detected! energy={energy:.4f}")
-                            self._last_event_time = now
-                            if self.on_cry_callback:
-                                self.on_cry_callback(energy)
-                        self._cry_frame_count = 0
-
-                    time.sleep(0.005)
+                    sd.sleep(200)
 
         except Exception as e:
             print("[CryDetector] ERROR opening or reading audio input:", e)
@@ -1,52 +1,185 @@
 # camera_stream.py
-from picamera2 import Picamera2, Preview
 import io
-from threading import Lock
-from time import sleep
+import os
 
-from PIL import Image  # apt: python3-pil
+from picamera2 import Picamera2
+from picamera2.encoders import MJPEGEncoder, Quality
+from picamera2.outputs import FileOutput
+from threading import Condition, Lock, Thread
+from time import monotonic, sleep
 
+import numpy as np
+import simplejpeg  # pip: simplejpeg (libjpeg-turbo), only for the software fallback
+
+
+STREAM_SIZE = (640, 480)
+# Hardware encoder quality; picamera2 maps this to an MJPEG bitrate
+MJPEG_QUALITY = Quality.HIGH
+# Software fallback: JPEG quality (1-100) and target frame rate
+JPEG_QUALITY = 80
+STREAM_FPS = 20
+# Software fallback skips encoding while the scene is static: mean abs luma
+# change on a 32x32 thumbnail below SCENE_THRESHOLD counts as static, but a
+# frame is still sent every KEYFRAME_SEC
+SCENE_THRESHOLD = float(os.getenv("CAMERA_SCENE_THRESHOLD", "2.0"))
+KEYFRAME_SEC = float(os.getenv("CAMERA_KEYFRAME_SEC", "2.0"))
+# Clients give up if no frame arrives for this long (producer died); always
+# well above KEYFRAME_SEC so a static scene never looks like a dead camera
+FRAME_TIMEOUT_SEC = max(5.0, 2 * KEYFRAME_SEC)
 
 _camera = None
+_latest = None
 _lock = Lock()
 
 
+class LatestFrame(io.BufferedIOBase):
+    """
+    Latest encoded JPEG, shared by every connected client.
+    Filled by a single producer (hardware encoder or capture thread),
+    so encode cost does not grow with the number of viewers. The multipart
+    chunk is also built once here, and clients yield that same object.
+    A file object so picamera2's FileOutput can write() and flush() to it.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.buf = None
+        self.part = None
+        self.seq = 0
+        self.cond = Condition()
+
+    def write(self, buf):
+        buf = bytes(buf)  # no-op for bytes; copies a view of a reused buffer
+        part = b"".join((
+            b"--frame\r\nContent-Type: image/jpeg\r\n",
+            b"Content-Length: %d\r\n\r\n" % len(buf),
+            buf,
+            b"\r\n",
+        ))
+        with self.cond:
+            self.buf = buf
+            self.part = part
+            self.seq += 1
+            self.cond.notify_all()
+        return len(buf)
+
+    def wait_next(self, last_seq, timeout=None):
+        """Block until a frame newer than last_seq exists; return (seq, part)."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq != last_seq, timeout)
+            return self.seq, self.part
+
+
+def _encode_yuv420(buf, width, height) -> bytes:
+    """
+    JPEG-encode a picamera2 YUV420 array (height * 3/2 rows of `stride` bytes)
+    straight from its planes: no RGB copy and no RGB->YCbCr pass in libjpeg.
+    """
+    stride = buf.shape[1]
+    y = buf[:height, :width]
+    # each chroma plane packs two half-width rows into every array row
+    u = buf[height:height + height // 4].reshape(height // 2, stride // 2)
+    v = buf[height + height // 4:height + height // 2].reshape(height // 2, stride // 2)
+    return simplejpeg.encode_jpeg_yuv_planes(
+        np.ascontiguousarray(y),
+        np.ascontiguousarray(u[:, :width // 2]),
+        np.ascontiguousarray(v[:, :width // 2]),
+        quality=JPEG_QUALITY,
+        fastdct=True,
+    )
+
+
+def _capture_loop(picam2, latest):
+    """Software producer: capture, encode once, publish to all clients."""
+    width, height = STREAM_SIZE
+    period = 1.0 / STREAM_FPS
+    next_t = monotonic()
+    prev_thumb = None  # thumbnail of the last frame actually sent
+    last_sent = 0.0
+    try:
+        while True:
+            frame = picam2.capture_array()
+            # 32x32 luma thumbnail by striding the Y plane (no resize, no copy)
+            thumb = frame[:height:height // 32, :width:width // 32][:32, :32].astype(np.int16)
+            now = monotonic()
+            changed = (prev_thumb is None
+                       or np.abs(thumb - prev_thumb).mean() >= SCENE_THRESHOLD)
+            if changed or now - last_sent >= KEYFRAME_SEC:
+                latest.write(_encode_yuv420(frame, width, height))
+                prev_thumb = thumb
+                last_sent = now
+            next_t += period
+            delay = next_t - monotonic()
+            if delay > 0:
+                sleep(delay)
+            else:
+                next_t = monotonic()
+    except Exception as e:
+        print(f"[Camera] Capture loop stopped: {e}")
+        _release_camera(latest)
+
+
+def _release_camera(latest):
+    """
+    Stop and close the camera feeding `latest` so the next client's
+    init_camera() reopens it. A no-op if it was already replaced.
+    """
+    global _camera, _latest
+    with _lock:
+        if _latest is not latest:
+            return
+        picam2 = _camera
+        _camera = None
+        _latest = None
+        for step in (picam2.stop_recording, picam2.close):
+            try:
+                step()
+            except Exception as e:
+                print(f"[Camera] Error releasing camera: {e}")
+
+
 def init_camera():
-    global _camera
+    """Open the camera and start its producer if needed; return the LatestFrame."""
+    global _camera, _latest
     with _lock:
         if _camera is None:
             picam2 = Picamera2()
-            config = picam2.create_preview_configuration(main={"size": (640, 480)})
+            # YUV420 is 1.5 bytes/pixel (vs 4 for the default XBGR8888) and
+            # is what both the hardware encoder and libjpeg work in natively
+            config = picam2.create_video_configuration(
+                main={"size": STREAM_SIZE, "format": "YUV420"}, encode="main"
+            )
             picam2.configure(config)
-            picam2.start()
+            latest = LatestFrame()
+            try:
+                # opens the V4L2 M2M device; e.g. Pi 5 has no hardware JPEG block
+                encoder = MJPEGEncoder()
+            except OSError as e:
+                print(f"[Camera] Hardware MJPEG unavailable ({e}); encoding in software")
+                picam2.start()
+                Thread(target=_capture_loop, args=(picam2, latest), daemon=True).start()
+            else:
+                # JPEGs are produced by the VPU; no per-frame CPU encoding
+                picam2.start_recording(encoder, FileOutput(latest), quality=MJPEG_QUALITY)
+                print("[Camera] Initialised Picamera2 (hardware MJPEG)")
+            _latest = latest
             _camera = picam2
-            print("[Camera] Initialised Picamera2")
-
-
-def get_jpeg_frame() -> bytes:
-    """
-    Capture a single JPEG frame from the camera.
-    """
-    global _camera
-    if _camera is None:
-        init_camera()
-
-    # capture array, convert to JPEG in memory
-    frame = _camera.capture_array()
-    img = Image.fromarray(frame)
-    buf = io.BytesIO()
-    img.save(buf, format="JPEG")
-    return buf.getvalue()
+        return _latest
 
 
 def mjpeg_frame_generator():
     """
     Generator to be used in a Flask Response for MJPEG streaming.
+    Each client only consumes frames; it never touches the camera.
     """
+    latest = init_camera()
+    seq = 0
     while True:
-        frame = get_jpeg_frame()
-        yield (
-            b"--frame\r\n"
-            b"Content-Type: image/jpeg\r\n\r\n" + frame + b"\r\n"
-        )
-        sleep(0.05)  # ~20 fps
+        new_seq, part = latest.wait_next(seq, timeout=FRAME_TIMEOUT_SEC)
+        if new_seq == seq:
+            # producer stalled (encoder or capture loop); reopen for the next client
+            print("[Camera] No new frame; closing stream")
+            _release_camera(latest)
+            return
+        seq = new_seq
+        yield part
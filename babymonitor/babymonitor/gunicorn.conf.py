@@ -0,0 +1,11 @@
+# gunicorn.conf.py
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# One process: the Pi camera and microphone can only be opened once.
+# gthread workers serve each request on its own thread, so long-lived
+# /video_feed streams don't block /api/status polls.
+worker_class = "gthread"
+workers = 1
+threads = 8
@@ -1,12 +1,46 @@
 import os
 import subprocess
 from pathlib import Path
-from threading import RLock   # RLock avoids deadlock when stop is called inside play
+from threading import Event, Lock, RLock, Thread   # RLock avoids deadlock when stop is called inside play
+
+import numpy as np
+import sounddevice as sd
+from scipy.io import wavfile  # apt/pip: python3-scipy
 
 SOUNDS_DIR = Path(__file__).resolve().parent / "sounds"
 
-_lullaby_process = None
+# Clips larger than this are memory-mapped instead of read into RAM
+MMAP_THRESHOLD_BYTES = 4 * 1024 * 1024
+# Frames per write; also how often the player checks for stop (~85 ms at 48 kHz)
+CHUNK_FRAMES = 4096
+
+_lullaby_process = None   # aplay fallback when sounddevice can't open the device
+_player = None            # _Playback for the current clip
+_stream = None            # OutputStream kept open between plays
+_stream_key = None
 _lock = RLock()
+_handoff_lock = Lock()    # writer exit vs. _stop_playback detaching its stream
+
+def _load_wav(path: Path):
+    big = path.stat().st_size > MMAP_THRESHOLD_BYTES
+    sr, data = wavfile.read(path, mmap=big)
+    if data.ndim == 1:
+        data = data.reshape(-1, 1)
+    return sr, data
+
+def _load_sounds():
+    """
+    Decode every sounds/*.wav once at import so play needs no disk or parse work.
+    """
+    cache = {}
+    for wav in sorted(SOUNDS_DIR.glob("*.wav")):
+        try:
+            cache[wav.resolve()] = _load_wav(wav)
+        except Exception as e:
+            print(f"[Lullaby] Could not decode {wav.name}: {e}")
+    return cache
+
+_sounds = _load_sounds()
 
 def _resolve_sound(name: str):
     """
@@ -28,19 +62,100 @@ def _resolve_sound(name: str):
     q = mapping.get(name)
     return q if q and q.exists() else None
 
+def _get_clip(path: Path):
+    key = path.resolve()
+    clip = _sounds.get(key)
+    if clip is None:
+        clip = _sounds[key] = _load_wav(path)
+    return clip
+
+def _get_stream(sr, channels, dtype, dev):
+    """
+    Reuse the open OutputStream unless the clip format or device changed.
+    """
+    global _stream, _stream_key
+    key = (sr, channels, np.dtype(dtype).name, dev)
+    if _stream is None or _stream_key != key:
+        if _stream is not None:
+            _stream.close()
+            _stream = None
+        _stream = sd.OutputStream(
+            samplerate=sr, channels=channels, dtype=np.dtype(dtype).name, device=dev
+        )
+        _stream_key = key
+    return _stream
+
+class _Playback:
+    """
+    One clip written to an OutputStream by its own thread, with its own stop
+    Event. If the writer is still stuck in write() when the next play starts,
+    its stream is detached from _stream and the writer closes it on exit.
+    """
+
+    def __init__(self, stream, data):
+        self.stream = stream
+        self.data = data
+        self.stop = Event()
+        self.done = False       # set by the writer under _handoff_lock
+        self.detached = False   # set by _stop_playback under _handoff_lock
+        self.thread = Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        stream, data = self.stream, self.data
+        try:
+            stream.start()
+            for start in range(0, len(data), CHUNK_FRAMES):
+                if self.stop.is_set():
+                    stream.abort()
+                    return
+                stream.write(np.ascontiguousarray(data[start:start + CHUNK_FRAMES]))
+            stream.stop()  # lets the buffered tail finish playing
+        except Exception as e:
+            print(f"[Lullaby] Playback error: {e}")
+        finally:
+            with _handoff_lock:
+                self.done = True
+                if self.detached:
+                    try:
+                        stream.close()
+                    except Exception as e:
+                        print(f"[Lullaby] Error closing stream: {e}")
+
+def _stop_playback() -> bool:
+    """Stop whatever is playing; return True if something was."""
+    global _lullaby_process, _player, _stream, _stream_key
+    was_playing = False
+    if _player and not _player.done:
+        _player.stop.set()
+        _player.thread.join(timeout=1.0)
+        with _handoff_lock:
+            if not _player.done:
+                # never give a stream to a new writer while the old one is in it
+                print("[Lullaby] Previous writer still busy; opening a new stream")
+                _player.detached = True
+                if _stream is _player.stream:
+                    _stream = None
+                    _stream_key = None
+        was_playing = True
+    _player = None
+    if _lullaby_process and _lullaby_process.poll() is None:
+        try:
+            _lullaby_process.terminate()
+        finally:
+            _lullaby_process = None
+        was_playing = True
+    return was_playing
+
 def play_lullaby(name: str) -> bool:
     """
-    Stop any previous playback and start a new one with aplay.
-    Honors APLAY_DEVICE if set (e.g., 'plughw:2,0').
+    Stop any previous playback and start a new one from the decoded cache.
+    Honors APLAY_DEVICE if set (e.g., 'plughw:2,0'); falls back to aplay
+    when sounddevice can't open that device.
     """
-    global _lullaby_process
+    global _lullaby_process, _player
     with _lock:
         # stop any previous playback (safe if none)
-        if _lullaby_process and _lullaby_process.poll() is None:
-            try:
-                _lullaby_process.terminate()
-            finally:
-                _lullaby_process = None
+        _stop_playback()
 
         sound_path = _resolve_sound(name)
         if not sound_path:
@@ -48,6 +163,17 @@ def play_lullaby(name: str) -> bool:
             return False
 
         dev = os.getenv("APLAY_DEVICE")
+        try:
+            sr, data = _get_clip(sound_path)
+            stream = _get_stream(sr, data.shape[1], data.dtype, dev)
+        except Exception as e:
+            print(f"[Lullaby] sounddevice unavailable ({e}); using aplay")
+        else:
+            print(f"[Lullaby] playing {sound_path.name} on device={dev}")
+            _player = _Playback(stream, data)
+            _player.thread.start()
+            return True
+
         cmd = ["aplay"]
         if dev:
             cmd += ["-D", dev]
@@ -66,13 +192,8 @@ def stop_lullaby():
     """
     Stop playback if it is running.
     """
-    global _lullaby_process
     with _lock:
-        if _lullaby_process and _lullaby_process.poll() is None:
-            print("[Lullaby] Stopping playback")
-            try:
-                _lullaby_process.terminate()
-            finally:
-                _lullaby_process = None
+        if _stop_playback():
+            print("[Lullaby] Stopped playback")
         else:
             print("[Lullaby] No active playback.")
@@ -1,6 +1,7 @@
 # monitor_resources.py
 import csv
 import time
+from contextlib import nullcontext
 from datetime import datetime
 from pathlib import Path
 import subprocess
@@ -8,6 +9,9 @@ import subprocess
 import psutil
 
 LOG_PATH = Path("logs/resource_log.csv")
+THERMAL_PATH = "/sys/class/thermal/thermal_zone0/temp"
+# rows buffered before hitting the disk (~1 min at the default 5 s interval)
+FLUSH_EVERY_ROWS = 12
 
 
 def get_cpu_temp_c() -> float:
@@ -29,15 +33,41 @@ def get_cpu_temp_c() -> float:
             return -1.0
 
 
+def open_thermal_zone():
+    """
+    Open the sysfs temperature file once for repeated reads (no fork per
+    sample). Use it in a with statement; it yields None when sysfs isn't
+    available, in which case fall back to get_cpu_temp_c().
+    """
+    try:
+        return open(THERMAL_PATH, "r")
+    except OSError:
+        return nullcontext()
+
+
+def read_sysfs_temp_c(tz) -> float:
+    """
+    Read the CPU temperature from a file returned by open_thermal_zone().
+    """
+    try:
+        tz.seek(0)
+        return int(tz.read()) / 1000.0
+    except (OSError, ValueError):
+        return -1.0
+
+
 def monitor(interval_sec=5):
     LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
 
     # Write header if file doesn't exist
     new_file = not LOG_PATH.exists()
-    with open(LOG_PATH, "a", newline="") as f:
+    psutil.cpu_percent(interval=None)  # prime: the first call always returns 0.0
+    with open(LOG_PATH, "a", newline="", buffering=64 * 1024) as f, \
+            open_thermal_zone() as tz:
         writer = csv.writer(f)
         if new_file:
             writer.writerow(["timestamp", "cpu_percent", "memory_percent", "temp_c"])
+        rows = 0
 
         print("[Monitor] Logging every", interval_sec, "seconds. Ctrl+C to stop.")
         try:
@@ -45,9 +75,11 @@ def monitor(interval_sec=5):
                 ts = datetime.now().isoformat(timespec="seconds")
                 cpu = psutil.cpu_percent(interval=None)
                 mem = psutil.virtual_memory().percent
-                temp = get_cpu_temp_c()
+                temp = read_sysfs_temp_c(tz) if tz is not None else get_cpu_temp_c()
                 writer.writerow([ts, cpu, mem, temp])
-                f.flush()
+                rows += 1
+                if rows % FLUSH_EVERY_ROWS == 0:
+                    f.flush()
                 time.sleep(interval_sec)
         except KeyboardInterrupt:
             print("\n[Monitor] Stopped.")
@@ -1,40 +1,381 @@
 # notifier.py
+import atexit
 import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
 import smtplib
+import ssl
+import threading
+import time
 from email.mime.text import MIMEText
+from email.policy import SMTP
+from email.utils import getaddresses
+from functools import lru_cache
 from pathlib import Path
+from typing import Optional
 
 CONFIG_PATH = Path("config/settings.json")
 
+logger = logging.getLogger("babymonitor.notifier")
 
-def load_email_config():
+
+def _setup_logging():
+    # Records are handed to a listener thread through a queue, so the
+    # sending thread never waits on the stderr lock or a write syscall.
+    records = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("[Notifier] %(message)s"))
+    listener = logging.handlers.QueueListener(records, handler)
+    listener.start()
+    atexit.register(listener.stop)
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+_setup_logging()
+
+
+class _Pipelining:
+    """
+    sendmail() (and so send_message()) using RFC 2920 PIPELINING when the
+    server offers it: MAIL FROM, every RCPT TO and DATA go out in a single
+    write and the replies are read back in order, saving a round trip per
+    command. Without the extension, smtplib's serial path is used.
+    """
+
+    def sendmail(self, from_addr, to_addrs, msg, mail_options=(), rcpt_options=()):
+        self.ehlo_or_helo_if_needed()
+        if not self.has_extn("pipelining"):
+            return super().sendmail(from_addr, to_addrs, msg, mail_options, rcpt_options)
+
+        if isinstance(msg, str):
+            msg = smtplib._fix_eols(msg).encode("ascii")
+        if isinstance(to_addrs, str):
+            to_addrs = [to_addrs]
+        mail_opts = list(mail_options)
+        if self.has_extn("size"):
+            mail_opts.insert(0, "size=%d" % len(msg))
+        rcpt_opts = "".join(" " + o for o in rcpt_options)
+
+        cmds = ["MAIL FROM:%s%s" % (smtplib.quoteaddr(from_addr), "".join(" " + o for o in mail_opts))]
+        cmds += ["RCPT TO:%s%s" % (smtplib.quoteaddr(addr), rcpt_opts) for addr in to_addrs]
+        cmds.append("DATA")
+        self.send("".join(c + "\r\n" for c in cmds))
+
+        mail_code, mail_resp = self.getreply()
+        refused = {}
+        for addr in to_addrs:
+            code, resp = self.getreply()
+            if code not in (250, 251):
+                refused[addr] = (code, resp)
+        data_code, data_resp = self.getreply()
+
+        if mail_code != 250 or len(refused) == len(to_addrs) or data_code != 354:
+            if data_code == 354:
+                # server took DATA anyway: end it with an empty message
+                self.send(".\r\n")
+                self.getreply()
+            if 421 in (mail_code, data_code):
+                self.close()
+            else:
+                self._rset()
+            if mail_code != 250:
+                raise smtplib.SMTPSenderRefused(mail_code, mail_resp, from_addr)
+            if len(refused) == len(to_addrs):
+                raise smtplib.SMTPRecipientsRefused(refused)
+            raise smtplib.SMTPDataError(data_code, data_resp)
+
+        q = re.sub(br"(?m)^\.", b"..", msg)  # dot-stuffing
+        if q[-2:] != b"\r\n":
+            q += b"\r\n"
+        self.send(q + b".\r\n")
+        code, resp = self.getreply()
+        if code != 250:
+            if code == 421:
+                self.close()
+            else:
+                self._rset()
+            raise smtplib.SMTPDataError(code, resp)
+        return refused
+
+
+class _PipeliningSMTP(_Pipelining, smtplib.SMTP):
+    pass
+
+
+class _PipeliningSMTP_SSL(_Pipelining, smtplib.SMTP_SSL):
+    """
+    Implicit TLS (SMTPS, usually port 465): no STARTTLS round trip and no
+    second EHLO. Reconnects offer the previous TLS session for resumption.
+    """
+
+    def _get_socket(self, host, port, timeout):
+        sock = smtplib.SMTP._get_socket(self, host, port, timeout)
+        return self.context.wrap_socket(
+            sock, server_hostname=self._host, session=_tls_sessions.get((host, port))
+        )
+
+
+_ssl_context: Optional[ssl.SSLContext] = None
+_tls_sessions = {}  # (server, port) -> ssl.SSLSession of the last SMTPS login
+
+
+def _get_ssl_context() -> ssl.SSLContext:
+    # one context for every connection: sessions can only resume within it
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = ssl.create_default_context()
+    return _ssl_context
+
+
+# Logged-in sessions reused across alerts, one per (server, port, sender).
+# A session idle for POOL_TTL_SEC or used for POOL_MAX_MESSAGES is closed
+# on the next acquire instead of risking a server-side 421 timeout.
+POOL_TTL_SEC = 60.0
+POOL_MAX_MESSAGES = 100
+# Bounds connect, NOOP and QUIT: a half-open connection must not stall the
+# worker (and _smtp_lock) until the kernel gives up retransmitting
+SMTP_TIMEOUT_SEC = 15.0
+_pool: dict = {}  # key -> [session, last_used (monotonic), messages sent]
+_smtp_lock = threading.Lock()  # guards _pool; smtplib isn't thread-safe
+
+# send_email_alert() only enqueues; one daemon thread does the SMTP work,
+# sending whatever has piled up (up to BATCH_MAX) as one batch
+BATCH_MAX = 20
+_queue: "queue.Queue[tuple[str, str]]" = queue.Queue(maxsize=1024)
+_worker: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+
+# email.enabled from the last parse (None = not loaded yet). While it is
+# not True, send_email_alert costs one stat of settings.json per call and
+# only re-parses the file once its mtime changes.
+_enabled: Optional[bool] = None
+
+
+@lru_cache(maxsize=1)
+def _read_email_config(mtime_ns):
+    # mtime_ns is only the cache key: an edited file gets a fresh parse
+    global _enabled
     with open(CONFIG_PATH, "r") as f:
         cfg = json.load(f)
-    return cfg.get("email", {})
+    email_cfg = cfg.get("email", {})
+    _enabled = bool(email_cfg.get("enabled", False))
+    if not _enabled:
+        logger.debug("Email sending disabled in config.")
+    return email_cfg
 
 
-def send_email_alert(subject: str, body: str):
-    email_cfg = load_email_config()
-    if not email_cfg.get("enabled", False):
-        print("[Notifier] Email sending disabled in config.")
-        return
+def load_email_config():
+    """
+    Email settings, re-parsed only when settings.json's mtime changes.
+    """
+    return _read_email_config(os.stat(CONFIG_PATH).st_mtime_ns)
 
-    sender = email_cfg["sender_email"]
-    password = email_cfg["sender_password"]
-    receiver = email_cfg["receiver_email"]
-    smtp_server = email_cfg["smtp_server"]
-    smtp_port = email_cfg["smtp_port"]
 
+def invalidate_email_config():
+    """Force the next load_email_config() to re-read settings.json."""
+    global _enabled
+    _read_email_config.cache_clear()
+    _enabled = None
+
+
+def _pool_key(email_cfg):
+    return (email_cfg["smtp_server"], email_cfg["smtp_port"], email_cfg["sender_email"])
+
+
+def _close_smtp(key=None, send_quit=True):
+    """
+    Close one pooled session, or all of them when key is None.
+    With send_quit=False the socket is dropped without a QUIT round trip.
+    """
+    for k in [key] if key is not None else list(_pool):
+        entry = _pool.pop(k, None)
+        if entry is None:
+            continue
+        if send_quit:
+            try:
+                entry[0].quit()
+                continue
+            except (smtplib.SMTPException, OSError):
+                pass
+        entry[0].close()
+
+
+atexit.register(_close_smtp)
+
+
+def _get_smtp(email_cfg) -> smtplib.SMTP:
+    """
+    Return the pooled session for this account, checked with NOOP, or open
+    and log in a new one if there is none, it expired, or the server
+    dropped it. Call with _smtp_lock held.
+    """
+    key = _pool_key(email_cfg)
+    now = time.monotonic()
+    for k, (_, last_used, count) in list(_pool.items()):
+        if now - last_used > POOL_TTL_SEC:
+            # the server has probably timed it out already; don't wait on QUIT
+            _close_smtp(k, send_quit=False)
+        elif count >= POOL_MAX_MESSAGES:
+            _close_smtp(k)
+
+    entry = _pool.get(key)
+    if entry is not None:
+        try:
+            if entry[0].noop()[0] == 250:
+                entry[1] = now
+                return entry[0]
+        except (smtplib.SMTPException, OSError):
+            pass
+        _close_smtp(key, send_quit=False)
+
+    host, port = key[0], key[1]
+    # implicit TLS by default on 465, STARTTLS otherwise
+    use_ssl = email_cfg.get("use_ssl", port == 465)
+    if use_ssl:
+        server = _PipeliningSMTP_SSL(
+            host, port, timeout=SMTP_TIMEOUT_SEC, context=_get_ssl_context()
+        )
+    else:
+        server = _PipeliningSMTP(host, port, timeout=SMTP_TIMEOUT_SEC)
+    try:
+        if not use_ssl:
+            server.starttls(context=_get_ssl_context())
+        server.login(email_cfg["sender_email"], email_cfg["sender_password"])
+    except Exception:
+        server.close()
+        raise
+    if use_ssl:
+        # TLS 1.3 tickets arrive after the handshake, so grab it post-login
+        _tls_sessions[(host, port)] = server.sock.session
+    _pool[key] = [server, now, 0]
+    return server
+
+
+def _build_message(email_cfg, subject: str, body: str) -> MIMEText:
     msg = MIMEText(body)
     msg["Subject"] = subject
-    msg["From"] = sender
-    msg["To"] = receiver
+    msg["From"] = email_cfg["sender_email"]
+    msg["To"] = email_cfg["receiver_email"]
+    return msg
+
+
+@lru_cache(maxsize=4)
+def _message_template(sender: str, receiver: str):
+    """
+    Header block shared by every plain-ASCII alert (everything but Subject),
+    serialized once by the email package, plus the envelope recipients.
+    """
+    tmpl = MIMEText("", "plain", "us-ascii")
+    tmpl["From"] = sender
+    tmpl["To"] = receiver
+    header = tmpl.as_bytes(policy=SMTP).split(b"\r\n\r\n", 1)[0] + b"\r\n"
+    rcpts = [addr for _, addr in getaddresses([receiver]) if addr]
+    return header, rcpts
 
+
+def _send_one(server, email_cfg, subject: str, body: str):
+    sender = email_cfg["sender_email"]
+    receiver = email_cfg["receiver_email"]
+    if (sender.isascii() and receiver.isascii()
+            and subject.isascii() and body.isascii() and "\n" not in subject
+            and "\r" not in subject and len(subject) <= 998 - len("Subject: ")
+            and all(len(l) <= 998 for l in body.splitlines())):
+        # fast path: splice Subject and body onto the cached header bytes
+        header, rcpts = _message_template(sender, receiver)
+        payload = b"".join((
+            header,
+            b"Subject: ", subject.encode("ascii"), b"\r\n\r\n",
+            # bare CR or LF -> CRLF, as smtplib does for str messages
+            smtplib._fix_eols(body).encode("ascii"),
+        ))
+        server.sendmail(sender, rcpts, payload)
+    else:
+        server.send_message(_build_message(email_cfg, subject, body))
+
+
+def send_email_alerts(items: list[tuple[str, str]]) -> int:
+    """
+    Send several (subject, body) alerts over one SMTP session.
+    A message the server refuses doesn't drop the session; the batch is
+    abandoned once a third of it has failed. Returns how many were sent.
+    """
+    if not items:
+        return 0
+    email_cfg = load_email_config()
+    if not email_cfg.get("enabled", False):
+        return 0
+
+    sent = failed = 0
+    try:
+        with _smtp_lock:
+            try:
+                server = _get_smtp(email_cfg)
+                for subject, body in items:
+                    try:
+                        _send_one(server, email_cfg, subject, body)
+                        sent += 1
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused,
+                            smtplib.SMTPDataError) as e:
+                        # smtplib already sent RSET; the session is still usable
+                        failed += 1
+                        logger.warning("Message refused: %s", e)
+                        # give up once a third of the batch has bounced
+                        if failed >= 3 and failed * 3 >= len(items):
+                            logger.error("Too many refusals; abandoning batch.")
+                            break
+            except Exception:
+                # don't reuse a session left in an unknown state
+                _close_smtp(_pool_key(email_cfg), send_quit=False)
+                raise
+            entry = _pool.get(_pool_key(email_cfg))
+            if entry is not None:
+                entry[1] = time.monotonic()
+                entry[2] += sent
+    except Exception:
+        logger.exception("Failed to send email")
+    if sent:
+        logger.info("Email sent (%d/%d).", sent, len(items))
+    return sent
+
+
+def _worker_loop():
+    while True:
+        batch = [_queue.get()]
+        try:
+            while len(batch) < BATCH_MAX:
+                batch.append(_queue.get_nowait())
+        except queue.Empty:
+            pass
+        try:
+            send_email_alerts(batch)
+        except Exception:
+            logger.exception("Failed to send email")
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_worker_loop, name="notifier", daemon=True)
+            _worker.start()
+
+
+def send_email_alert(subject: str, body: str):
+    """
+    Queue an alert and return immediately; the notifier thread sends it.
+    """
+    if not _enabled:
+        # picks up email being switched on in settings.json without a restart
+        load_email_config()
+        if not _enabled:
+            return
+    _ensure_worker()
     try:
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(sender, password)
-            server.send_message(msg)
-        print("[Notifier] Email sent.")
-    except Exception as e:
-        print("[Notifier] Failed to send email:", e)
+        _queue.put_nowait((subject, body))
+    except queue.Full:
+        logger.warning("Alert queue full; dropping: %s", subject)
@@ -0,0 +1,222 @@
+# tests/test_notifier.py
+"""
+_Pipelining.sendmail and _send_one against a scripted SMTP server on a
+loopback socket.
+
+The fake server advertises PIPELINING and holds back its replies to MAIL
+and RCPT until it has read DATA, so a client that waits for each reply
+(i.e. doesn't pipeline) times out instead of passing.
+
+Run from babymonitor/babymonitor:  python -m unittest discover tests
+"""
+import email
+import smtplib
+import socket
+import sys
+import threading
+import unittest
+from email.header import decode_header, make_header
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from notifier import _PipeliningSMTP, _message_template, _send_one  # noqa: E402
+
+TIMEOUT = 5.0
+
+
+class FakeSMTPServer:
+    """
+    One-connection SMTP server. Replies can be overridden per test:
+    mail / data / end are reply lines, refuse is a set of RCPT addresses
+    answered with 550. Commands and received messages are recorded.
+    """
+
+    def __init__(self, pipelining=True, mail=b"250 ok", data=b"354 go",
+                 end=b"250 queued", refuse=()):
+        self.pipelining = pipelining
+        self.mail, self.data, self.end = mail, data, end
+        self.refuse = set(refuse)
+        self.commands = []
+        self.messages = []
+        self.sock = socket.create_server(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.sock.close()
+        self.thread.join(TIMEOUT)
+
+    def _serve(self):
+        conn, _ = self.sock.accept()
+        with conn, conn.makefile("rb") as f:
+            conn.sendall(b"220 fake ESMTP\r\n")
+            pending = []  # replies held back until DATA
+
+            def reply(line):
+                if self.pipelining:
+                    pending.append(line)
+                else:
+                    conn.sendall(line + b"\r\n")
+
+            while True:
+                line = f.readline()
+                if not line:
+                    return
+                cmd = line.rstrip(b"\r\n").decode("ascii")
+                verb = cmd.split(":")[0].split(" ")[0].upper()
+                self.commands.append(verb if verb in ("RSET", "NOOP", "QUIT") else cmd)
+                if verb == "EHLO":
+                    ext = [b"250-fake", b"250-SIZE 1000000"]
+                    if self.pipelining:
+                        ext.append(b"250-PIPELINING")
+                    conn.sendall(b"\r\n".join(ext + [b"250 8BITMIME"]) + b"\r\n")
+                elif verb == "MAIL":
+                    reply(self.mail)
+                elif verb == "RCPT":
+                    addr = cmd.split("<", 1)[1].split(">", 1)[0]
+                    reply(b"550 no such user" if addr in self.refuse else b"250 ok")
+                elif verb == "DATA":
+                    conn.sendall(b"".join(r + b"\r\n" for r in pending + [self.data]))
+                    pending.clear()
+                    if self.data.startswith(b"421"):
+                        return
+                    if self.data.startswith(b"354"):
+                        self.messages.append(self._read_data(f))
+                        conn.sendall(self.end + b"\r\n")
+                        if self.end.startswith(b"421"):
+                            return
+                elif verb in ("RSET", "NOOP"):
+                    conn.sendall(b"250 ok\r\n")
+                elif verb == "QUIT":
+                    conn.sendall(b"221 bye\r\n")
+                    return
+                else:
+                    conn.sendall(b"500 unrecognised\r\n")
+
+    @staticmethod
+    def _read_data(f):
+        # raw message as sent, still dot-stuffed, without the final "."
+        data = b""
+        while True:
+            line = f.readline()
+            if line in (b".\r\n", b""):
+                return data
+            data += line
+
+
+class PipeliningSendmailTest(unittest.TestCase):
+
+    def connect(self, **server_kw):
+        self.server = FakeSMTPServer(**server_kw)
+        self.addCleanup(self.server.close)
+        client = _PipeliningSMTP("127.0.0.1", self.server.port, timeout=TIMEOUT)
+        self.addCleanup(client.close)
+        return client
+
+    def test_pipelined_commands_and_partial_refusal(self):
+        client = self.connect(refuse={"bad@example.org"})
+        refused = client.sendmail(
+            "me@example.org", ["ok@example.org", "bad@example.org"], b"Subject: hi\r\n\r\nbody\r\n"
+        )
+        self.assertEqual(refused, {"bad@example.org": (550, b"no such user")})
+        self.assertEqual(self.server.messages, [b"Subject: hi\r\n\r\nbody\r\n"])
+        self.assertEqual(
+            [c.split(":")[0] for c in self.server.commands[1:5]],
+            ["MAIL FROM", "RCPT TO", "RCPT TO", "DATA"],
+        )
+        self.assertIn("size=", self.server.commands[1])
+
+    def test_all_refused_ends_accepted_data_and_resets(self):
+        client = self.connect(refuse={"a@example.org", "b@example.org"})
+        with self.assertRaises(smtplib.SMTPRecipientsRefused) as cm:
+            client.sendmail("me@example.org", ["a@example.org", "b@example.org"], b"x\r\n")
+        self.assertEqual(set(cm.exception.recipients), {"a@example.org", "b@example.org"})
+        # the server said 354 anyway, so an empty message was sent to close DATA
+        self.assertEqual(self.server.messages, [b""])
+        self.assertEqual(self.server.commands[-1], "RSET")
+        # the session is still usable
+        self.assertEqual(client.noop()[0], 250)
+
+    def test_sender_refused_resets(self):
+        client = self.connect(mail=b"550 sender rejected", data=b"503 no valid sender")
+        with self.assertRaises(smtplib.SMTPSenderRefused):
+            client.sendmail("me@example.org", ["ok@example.org"], b"x\r\n")
+        self.assertEqual(self.server.messages, [])
+        self.assertEqual(self.server.commands[-1], "RSET")
+
+    def test_421_on_data_closes_connection(self):
+        client = self.connect(data=b"421 shutting down")
+        with self.assertRaises(smtplib.SMTPDataError) as cm:
+            client.sendmail("me@example.org", ["ok@example.org"], b"x\r\n")
+        self.assertEqual(cm.exception.smtp_code, 421)
+        self.assertIsNone(client.sock)
+        self.assertNotIn("RSET", self.server.commands)
+
+    def test_421_after_message_closes_connection(self):
+        client = self.connect(end=b"421 shutting down")
+        with self.assertRaises(smtplib.SMTPDataError) as cm:
+            client.sendmail("me@example.org", ["ok@example.org"], b"x\r\n")
+        self.assertEqual(cm.exception.smtp_code, 421)
+        self.assertIsNone(client.sock)
+
+    def test_dot_stuffing_and_line_endings(self):
+        client = self.connect()
+        client.sendmail("me@example.org", "ok@example.org", "one\n.two\r\n..three\rend")
+        self.assertEqual(
+            self.server.messages, [b"one\r\n..two\r\n...three\r\nend\r\n"]
+        )
+
+    def test_serial_fallback_without_pipelining(self):
+        client = self.connect(pipelining=False, refuse={"bad@example.org"})
+        refused = client.sendmail(
+            "me@example.org", ["ok@example.org", "bad@example.org"], b"x\r\n"
+        )
+        self.assertEqual(refused, {"bad@example.org": (550, b"no such user")})
+        self.assertEqual(self.server.messages, [b"x\r\n"])
+
+
+class SendOneTest(unittest.TestCase):
+    """The pre-serialized fast path and the MIMEText path must agree."""
+
+    def send(self, sender, receiver, subject, body):
+        server = FakeSMTPServer()
+        self.addCleanup(server.close)
+        client = _PipeliningSMTP("127.0.0.1", server.port, timeout=TIMEOUT)
+        self.addCleanup(client.close)
+        cfg = {"sender_email": sender, "receiver_email": receiver}
+        _send_one(client, cfg, subject, body)
+        self.assertEqual(len(server.messages), 1)
+        return server, email.message_from_bytes(server.messages[0])
+
+    def test_fast_path_message(self):
+        server, msg = self.send(
+            "Monitor <me@example.org>", "a@example.org, B <b@example.org>",
+            "Baby Monitor Alert: Cry detected", "Cry detected\nat 12:00.",
+        )
+        self.assertEqual(msg["From"], "Monitor <me@example.org>")
+        self.assertEqual(msg["To"], "a@example.org, B <b@example.org>")
+        self.assertEqual(msg["Subject"], "Baby Monitor Alert: Cry detected")
+        self.assertEqual(msg.get_content_type(), "text/plain")
+        self.assertEqual(msg.get_payload(), "Cry detected\r\nat 12:00.\r\n")
+        rcpts = [c for c in server.commands if c.startswith("RCPT")]
+        self.assertEqual(rcpts, ["RCPT TO:<a@example.org>", "RCPT TO:<b@example.org>"])
+
+    def test_non_ascii_display_name_uses_mime_path(self):
+        _, msg = self.send(
+            "me@example.org", "C\u00e9line <c@example.org>", "Alert", "body",
+        )
+        to = str(make_header(decode_header(msg["To"])))
+        self.assertEqual(to, "C\u00e9line <c@example.org>")
+        self.assertEqual(msg.get_payload(), "body\r\n")
+
+    def test_template_is_cached(self):
+        self.assertIs(
+            _message_template("me@example.org", "a@example.org"),
+            _message_template("me@example.org", "a@example.org"),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+# wsgi.py
+"""
+Production entrypoint (run from this folder):
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Don't use --preload: the detector thread must start inside the worker.
+"""
+import fcntl
+import os
+
+from app import app, start_cry_detector
+
+DETECTOR_LOCK_PATH = os.getenv("DETECTOR_LOCK", "/tmp/babymonitor-detector.lock")
+
+_detector_lock = None
+
+
+def _start_detector_once():
+    """Only the worker holding the file lock opens the microphone."""
+    global _detector_lock
+    f = open(DETECTOR_LOCK_PATH, "w")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        print(f"[WSGI] pid {os.getpid()}: CryDetector already running in another worker")
+        return
+    # keep the file open: the lock is released when this process exits
+    _detector_lock = f
+    start_cry_detector()
+
+
+_start_detector_once()